@@ -1,6 +1,9 @@
 import pytest
 import os
 
+# Tests run against the in-memory report store, without disk I/O
+os.environ.setdefault('REPORT_STORE_BACKEND', 'memory')
+
 @pytest.fixture(autouse=True)
 def setup_test_env():
     """Setup test environment variables"""
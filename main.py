@@ -9,7 +9,9 @@ from groq import Groq
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-from utils import split_text_into_chunks, whisper, get_gpt_response, supported_formats
+from utils import split_text_into_chunks, whisper, get_gpt_response, supported_formats, format_task_usage, TruncatedResponseError
+from storage import create_report_store
+import io
 import logging
 from functools import wraps
 from typing import Optional
@@ -23,15 +25,15 @@ bot = TeleBot(os.getenv('BOT_TOKEN'))
 bot.set_my_commands([
     BotCommand('start', 'start the bot'),
     BotCommand('help', 'get help'),
+    BotCommand('usage', 'GPT token usage per task'),
 ])
 
-# ایجاد فولدرها در صورت عدم وجود
-BASE_REPORTS_DIR = "reports"
-DAILY_DIR = os.path.join(BASE_REPORTS_DIR, "daily-report")
-WEEKLY_DIR = os.path.join(BASE_REPORTS_DIR, "weekly-report")
-
-os.makedirs(DAILY_DIR, exist_ok=True)
-os.makedirs(WEEKLY_DIR, exist_ok=True)
+# نوع و مسیر ذخیره‌سازی از REPORT_STORE_BACKEND و REPORTS_DIR خوانده می‌شود
+# و همه گزارش‌ها، نمودارها و metadata.json از طریق report_store خوانده و نوشته می‌شوند
+DAILY_KEY = "daily-report"
+WEEKLY_KEY = "weekly-report"
+METADATA_FILENAME = "metadata.json"
+report_store = create_report_store()
 
 # Setup logging
 logging.basicConfig(
@@ -70,29 +72,28 @@ def get_next_report_filename(folder, base_name="report", extension=".md"):
     """
     Generate the next available filename in sequence, taking weeks into account
     Args:
-        folder: Directory path
+        folder: Report store key prefix, e.g. DAILY_KEY
         base_name: Base name for the file
         extension: File extension
     Returns:
-        str: Next available filename
+        str: Next available report store key
     """
     # Load existing metadata to determine the current week and report count
-    metadata_file = os.path.join(folder, "metadata.json")
-    if os.path.exists(metadata_file):
-        with open(metadata_file, "r", encoding="utf-8") as file:
-            metadata = json.load(file)
-            current_week = len(metadata)  # Current week (1-based)
-            if current_week > 0:
-                reports_in_current_week = len([
-                    entry for entry in metadata[current_week - 1]
-                    if isinstance(entry, dict) and 'filename' in entry
-                ])
-                if reports_in_current_week >= 7:
-                    current_week += 1
-                    reports_in_current_week = 0
-            else:
-                current_week = 1
+    metadata_file = f"{folder}/{METADATA_FILENAME}"
+    if report_store.exists(metadata_file):
+        metadata = json.loads(report_store.read_text(metadata_file))
+        current_week = len(metadata)  # Current week (1-based)
+        if current_week > 0:
+            reports_in_current_week = len([
+                entry for entry in metadata[current_week - 1]
+                if isinstance(entry, dict) and 'filename' in entry
+            ])
+            if reports_in_current_week >= 7:
+                current_week += 1
                 reports_in_current_week = 0
+        else:
+            current_week = 1
+            reports_in_current_week = 0
     else:
         current_week = 1
         reports_in_current_week = 0
@@ -103,23 +104,12 @@ def get_next_report_filename(folder, base_name="report", extension=".md"):
     
     return filename
 
-def get_next_weekly_folder():
-    """ایجاد نام فولدر هفته جدید."""
-    week_number = 1
-    while True:
-        weekly_folder = os.path.join(WEEKLY_DIR, f"daily-report-week{week_number}")
-        if not os.path.exists(weekly_folder):
-            os.makedirs(weekly_folder, exist_ok=True)
-            return weekly_folder
-        week_number += 1
-
-def log_report_metadata(folder, metadata, filename="metadata.json"):
-    """ذخیره اطلاعات متادیتا در فایل JSON مشخص شده."""
+def log_report_metadata(folder, metadata, filename=METADATA_FILENAME):
+    """ذخیره اطلاعات متادیتا در فایل JSON مشخص شده در report_store."""
     try:
-        log_file = os.path.join(folder, filename)
-        if os.path.exists(log_file):
-            with open(log_file, "r", encoding="utf-8") as file:
-                logs = json.load(file)
+        log_file = f"{folder}/{filename}"
+        if report_store.exists(log_file):
+            logs = json.loads(report_store.read_text(log_file))
         else:
             logs = []
 
@@ -163,14 +153,13 @@ def log_report_metadata(folder, metadata, filename="metadata.json"):
             }
             logs[week_index].append(summary)
 
-        with open(log_file, "w", encoding="utf-8") as file:
-            json.dump(logs, file, indent=4, ensure_ascii=False)
+        report_store.write(log_file, json.dumps(logs, indent=4, ensure_ascii=False))
     except Exception as e:
         print(f"Error in log_report_metadata: {str(e)}")
         return
 
 def create_weekly_plot(ai_hours, app_hours, week_number):
-    """Create a plot for weekly hours and save it."""
+    """Create a plot for weekly hours and save it to the report store."""
     try:
         # Define x-axis labels for the plot
         days_of_week = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
@@ -201,12 +190,14 @@ def create_weekly_plot(ai_hours, app_hours, week_number):
         plt.legend()
         plt.tight_layout()
         
-        # Save plot to file
-        plot_filename = f'week_{week_number}_development_hours.png'
-        plt.savefig(plot_filename)
+        # Render plot into memory and hand it to the report store
+        plot_key = f"{WEEKLY_KEY}/daily-report-week{week_number}/week_{week_number}_development_hours.png"
+        buffer = io.BytesIO()
+        plt.savefig(buffer, format='png')
         plt.close()  # Close figure to free memory
+        report_store.write(plot_key, buffer.getvalue())
         
-        return plot_filename
+        return plot_key
     except Exception as e:
         print(f"Error creating plot for week {week_number}: {str(e)}")
         return None
@@ -214,13 +205,12 @@ def create_weekly_plot(ai_hours, app_hours, week_number):
 def consolidate_reports_and_create_weekly():
     """Consolidate daily reports and create weekly summary"""
     # Check for metadata file
-    metadata_file = os.path.join(DAILY_DIR, "metadata.json")
-    if not os.path.exists(metadata_file):
+    metadata_file = f"{DAILY_KEY}/{METADATA_FILENAME}"
+    if not report_store.exists(metadata_file):
         return
 
     # Load metadata
-    with open(metadata_file, "r", encoding="utf-8") as file:
-        metadata_logs = json.load(file)
+    metadata_logs = json.loads(report_store.read_text(metadata_file))
     
     # Process each week in metadata
     for week_index, week_data in enumerate(metadata_logs):
@@ -230,49 +220,47 @@ def consolidate_reports_and_create_weekly():
             summary = week_data[-1]['week_summary']
             week_reports = [entry['filename'] for entry in week_data[:7]]
             
-            # Create weekly folder
-            weekly_folder = os.path.join(WEEKLY_DIR, f"daily-report-week{week_number}")
-            os.makedirs(weekly_folder, exist_ok=True)
+            # Weekly folder key
+            weekly_folder = f"{WEEKLY_KEY}/daily-report-week{week_number}"
 
-            # Setup plot paths
+            # Setup plot key
             plot_filename = f'week_{week_number}_development_hours.png'
-            plot_destination = os.path.join(weekly_folder, plot_filename)
+            plot_destination = f"{weekly_folder}/{plot_filename}"
 
             # Only create plot and move files if they haven't been processed yet
-            weekly_report_path = os.path.join(WEEKLY_DIR, f"weekly_report{week_number}.md")
-            if not os.path.exists(weekly_report_path) or not os.path.exists(plot_destination):
-                # Create plot
-                if not os.path.exists(plot_destination):
-                    temp_plot = create_weekly_plot(
+            weekly_report_path = f"{WEEKLY_KEY}/weekly_report{week_number}.md"
+            if not report_store.exists(weekly_report_path) or not report_store.exists(plot_destination):
+                # Create plot directly in the weekly folder
+                if not report_store.exists(plot_destination):
+                    create_weekly_plot(
                         summary['ai_hours_list'],
                         summary['app_hours_list'],
                         week_number
                     )
-                    # Move plot to weekly folder
-                    if temp_plot:
-                        os.rename(temp_plot, plot_destination)
                 
                 # Generate weekly report if needed
-                if not os.path.exists(weekly_report_path):
+                if not report_store.exists(weekly_report_path):
                     # Consolidate all daily reports
                     consolidated_text = ""
                     for report_file in week_reports:
-                        report_path = os.path.join(DAILY_DIR, report_file)
-                        if os.path.exists(report_path):
-                            with open(report_path, "r", encoding="utf-8") as file:
-                                consolidated_text += file.read() + "\n\n"
+                        report_path = f"{DAILY_KEY}/{report_file}"
+                        if report_store.exists(report_path):
+                            consolidated_text += report_store.read_text(report_path) + "\n\n"
                     
-                    # Generate weekly summary using GPT
-                    weekly_report = get_gpt_response(consolidated_text, openai_client, task="weekly-report")
-                    with open(weekly_report_path, "w", encoding="utf-8") as file:
-                        file.write(weekly_report)
+                    # Generate weekly summary using GPT; skip the week so it is retried later
+                    try:
+                        weekly_report = get_gpt_response(consolidated_text, openai_client, task="weekly-report")
+                    except TruncatedResponseError as e:
+                        logger.error(f"Weekly report for week {week_number} not saved: {str(e)}")
+                        continue
+                    report_store.write(weekly_report_path, weekly_report)
 
                 # Move daily reports to weekly folder
                 for report_file in week_reports:
-                    source_path = os.path.join(DAILY_DIR, report_file)
-                    destination_path = os.path.join(weekly_folder, report_file)
-                    if os.path.exists(source_path) and not os.path.exists(destination_path):
-                        os.rename(source_path, destination_path)
+                    source_path = f"{DAILY_KEY}/{report_file}"
+                    destination_path = f"{weekly_folder}/{report_file}"
+                    if report_store.exists(source_path) and not report_store.exists(destination_path):
+                        report_store.move(source_path, destination_path)
 
             # Always yield paths for completed weeks, whether they were just created or already existed
             yield {
@@ -292,12 +280,12 @@ def send_weekly_reports(chat_id):
     # Only send if we found a completed week
     if latest_week:
         # Send plot with caption
-        with open(latest_week['plot_path'], 'rb') as photo:
+        with report_store.open(latest_week['plot_path']) as photo:
             bot.send_photo(chat_id, photo, 
                          caption=f"Weekly Development Hours Summary - Week {latest_week['week_number']}")
         
         # Send report document
-        with open(latest_week['report_path'], 'rb') as report:
+        with report_store.open(latest_week['report_path']) as report:
             bot.send_document(chat_id, report, 
                            caption=f"Weekly Report - Week {latest_week['week_number']}")
 
@@ -305,6 +293,11 @@ def send_weekly_reports(chat_id):
 def send_welcome_message(message):
     bot.send_message(message.chat.id, f"Hello dear <b>{message.from_user.first_name}</b>", parse_mode="HTML")
 
+@bot.message_handler(commands=['usage'])
+def send_usage(message):
+    """Reply with per-task GPT token usage and latency"""
+    bot.reply_to(message, format_task_usage())
+
 @rate_limit(60)
 @bot.message_handler(content_types=['audio', 'video', 'voice'])
 def handle_files(message):
@@ -342,24 +335,28 @@ def handle_files(message):
         # Get transcription using Whisper
         transcription_text = whisper(file_link, groq_client)
         # Generate report using GPT
-        final_response = get_gpt_response(transcription_text, openai_client, task="daily-report")
+        try:
+            final_response = get_gpt_response(transcription_text, openai_client, task="daily-report")
+        except TruncatedResponseError:
+            bot.delete_message(message.chat.id, waiting_msg.message_id)
+            bot.reply_to(message, "The report was too long and got cut off. Please send a shorter description.")
+            return
         
         # Clean up and save report
         bot.delete_message(message.chat.id, waiting_msg.message_id)
-        report_filename = get_next_report_filename(DAILY_DIR)
-        with open(report_filename, "w", encoding="utf-8") as file:
-            file.write(final_response)
+        report_filename = get_next_report_filename(DAILY_KEY)
+        report_store.write(report_filename, final_response)
 
-        # Save metadata
+        # Save metadata; queued after the report, so it never reaches disk before it
         metadata = {
             "filename": os.path.basename(report_filename),
             "path": report_filename,
             "generated_at": datetime.now().isoformat()
         }
-        log_report_metadata(DAILY_DIR, metadata)
+        log_report_metadata(DAILY_KEY, metadata)
 
         # Send report back to user
-        with open(report_filename, "rb") as file:
+        with report_store.open(report_filename) as file:
             bot.send_document(message.chat.id, file)
 
         # Only process and send weekly reports if this report completed a week
@@ -377,41 +374,46 @@ def process_text(message):
     waiting_msg = bot.reply_to(message, 'I received the info, please wait..')
     
     # Generate daily report from text
-    final_response = get_gpt_response(message.text, openai_client, task="daily-report")
+    try:
+        final_response = get_gpt_response(message.text, openai_client, task="daily-report")
+    except TruncatedResponseError:
+        bot.delete_message(message.chat.id, waiting_msg.message_id)
+        bot.reply_to(message, "The report was too long and got cut off. Please send a shorter description.")
+        return
     
     # Remove waiting message
     bot.delete_message(message.chat.id, waiting_msg.message_id)
 
-    # Save report to file
-    report_filename = get_next_report_filename(DAILY_DIR)
-    with open(report_filename, "w", encoding="utf-8") as file:
-        file.write(final_response)
-    
+    # Extract hours before saving, so a bad answer doesn't leave an orphan report
     hours = get_gpt_response(message.text, openai_client, task="worked_hours")
     try:
         # Parse hours data
-        json_string = hours.replace("'", '"')
-        data = json.loads(json_string)
-    except json.JSONDecodeError:
+        data = json.loads(hours)
+        ai_hours, app_hours = data['ai'], data['app']
+    except (json.JSONDecodeError, KeyError, TypeError):
         bot.reply_to(message, "Error processing hours data. Please try again.")
         return
 
+    # Save report through the report store
+    report_filename = get_next_report_filename(DAILY_KEY)
+    report_store.write(report_filename, final_response)
+
     # Get the report number to check if it completes a week
     report_num = int(''.join(filter(str.isdigit, os.path.basename(report_filename))))
     is_week_complete = report_num % 7 == 0  # True if this report completes a week
 
-    # Save metadata
+    # Save metadata; queued after the report, so it never reaches disk before it
     metadata = {
         "filename": os.path.basename(report_filename),
         "path": report_filename,
         "generated_at": datetime.now().isoformat(),
-        'ai': data['ai'],
-        'app': data['app']
+        'ai': ai_hours,
+        'app': app_hours
     }
-    log_report_metadata(DAILY_DIR, metadata)
+    log_report_metadata(DAILY_KEY, metadata)
 
     # Send report to user
-    with open(report_filename, "rb") as file:
+    with report_store.open(report_filename) as file:
         bot.send_document(message.chat.id, file)
 
     # Only process and send weekly reports if this report completed a week
@@ -426,5 +428,7 @@ except Exception as e:
     # Log any polling errors
     print(f"Bot polling error: {str(e)}")
 finally:
-    # Ensure bot stops properly
+    # Ensure bot stops properly and pending reports reach the disk
     bot.stop_polling()
+    logger.info("GPT usage per task:\n" + format_task_usage())
+    report_store.close()
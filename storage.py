@@ -0,0 +1,304 @@
+import os
+import io
+import atexit
+import threading
+import time
+from abc import ABC, abstractmethod
+
+# Absolute default, so reports don't depend on the bot's working directory
+DEFAULT_REPORTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reports")
+
+
+class ReportStore(ABC):
+    """
+    Base interface for report and plot persistence.
+    Keys are relative paths such as "daily-report/report1.md".
+    """
+
+    @abstractmethod
+    def write(self, key, data):
+        pass
+
+    @abstractmethod
+    def read(self, key):
+        pass
+
+    @abstractmethod
+    def exists(self, key):
+        pass
+
+    @abstractmethod
+    def delete(self, key):
+        pass
+
+    def move(self, source, destination):
+        """Move a stored object to a new key."""
+        self.write(destination, self.read(source))
+        self.delete(source)
+
+    def read_text(self, key):
+        return self.read(key).decode("utf-8")
+
+    def open(self, key):
+        """Return a named file-like object, e.g. for bot.send_document."""
+        file = io.BytesIO(self.read(key))
+        file.name = os.path.basename(key)
+        return file
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class MemoryReportStore(ReportStore):
+    """Keep everything in a dict, so tests and benchmarks never touch the disk."""
+
+    def __init__(self):
+        self.objects = {}
+        self.lock = threading.Lock()
+
+    def write(self, key, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        with self.lock:
+            self.objects[key] = bytes(data)
+
+    def read(self, key):
+        with self.lock:
+            if key not in self.objects:
+                raise FileNotFoundError(key)
+            return self.objects[key]
+
+    def exists(self, key):
+        with self.lock:
+            return key in self.objects
+
+    def delete(self, key):
+        with self.lock:
+            self.objects.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.objects.clear()
+
+
+class LocalReportStore(ReportStore):
+    """
+    Write-behind store on the local filesystem.
+    Writes are queued in memory and flushed by a background thread once
+    max_pending writes are queued or flush_interval seconds have passed.
+    A flush writes every file of the batch to a temp file, fsyncs them
+    together, renames them into place and then fsyncs the touched
+    directories once. Reads see queued and in-flight writes before they
+    reach the disk. Disk I/O never runs while self.lock is held.
+    Args:
+        root: Base directory; keys are resolved relative to it
+        flush_interval: Maximum seconds a write waits before being flushed
+        max_pending: Number of queued writes that triggers an early flush
+    """
+
+    def __init__(self, root, flush_interval=1.0, max_pending=16):
+        self.root = root
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.pending = {}  # key -> bytes, or None for a pending delete
+        self.in_flight = {}  # batch currently being flushed, same layout
+        self.generations = {}  # key -> number of writes/deletes queued so far
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.closed = False
+        os.makedirs(root, exist_ok=True)
+        self.worker = threading.Thread(target=self._run, name="report-store-flush", daemon=True)
+        self.worker.start()
+        atexit.register(self.close)
+
+    def _path(self, key):
+        return os.path.join(self.root, key)
+
+    def _enqueue(self, key, data):
+        """Queue a write (bytes) or delete (None); caller holds self.lock."""
+        if self.closed:
+            raise ValueError("I/O operation on closed report store")
+        # Re-queued keys move to the end, so a flush applies changes in the
+        # order they were last made (a report lands before the metadata naming it)
+        self.pending.pop(key, None)
+        self.pending[key] = data
+        self.generations[key] = self.generations.get(key, 0) + 1
+        if len(self.pending) >= self.max_pending:
+            self.wakeup.notify()
+
+    def write(self, key, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        with self.lock:
+            self._enqueue(key, bytes(data))
+
+    def delete(self, key):
+        with self.lock:
+            self._enqueue(key, None)
+
+    def _queued(self, key):
+        """Return (True, data) if key has an unflushed change; caller holds self.lock."""
+        for batch in (self.pending, self.in_flight):
+            if key in batch:
+                return True, batch[key]
+        return False, None
+
+    def _read_disk(self, key, reader):
+        """
+        Run reader(path) outside the lock and retry if the key was written
+        meanwhile, so the result is never older than a queued change.
+        Returns (queued_data, None) if the key is queued, else (None, result).
+        """
+        while True:
+            with self.lock:
+                queued, data = self._queued(key)
+                if queued:
+                    return (data,), None
+                generation = self.generations.get(key, 0)
+            result = reader(self._path(key))
+            with self.lock:
+                if self.generations.get(key, 0) == generation:
+                    return None, result
+
+    def read(self, key):
+        def read_file(path):
+            try:
+                with open(path, "rb") as file:
+                    return file.read()
+            except FileNotFoundError:
+                return None
+
+        queued, data = self._read_disk(key, read_file)
+        if queued is not None:
+            data = queued[0]
+        if data is None:
+            raise FileNotFoundError(key)
+        return data
+
+    def exists(self, key):
+        queued, found = self._read_disk(key, os.path.exists)
+        if queued is not None:
+            return queued[0] is not None
+        return found
+
+    def flush(self):
+        """Write all queued changes to disk, grouping the fsyncs of the batch."""
+        with self.flush_lock:
+            with self.lock:
+                self.in_flight = self.pending
+                self.pending = {}
+                batch = list(self.in_flight.items())
+            if not batch:
+                return
+
+            temp_paths = {}  # key -> temp file not yet renamed into place
+            open_files = []
+            directories = set()
+            try:
+                # Write every temp file first, then fsync them together
+                for key, data in batch:
+                    if data is None:
+                        continue
+                    path = self._path(key)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    temp_paths[key] = f"{path}.tmp"
+                    file = open(temp_paths[key], "wb")
+                    open_files.append(file)
+                    file.write(data)
+                    file.flush()
+                for file in open_files:
+                    os.fsync(file.fileno())
+                while open_files:
+                    open_files.pop().close()
+
+                # Apply in queue order, so a move writes its destination before removing its source
+                for key, data in batch:
+                    path = self._path(key)
+                    if data is None:
+                        try:
+                            os.remove(path)
+                        except FileNotFoundError:
+                            pass
+                    else:
+                        os.replace(temp_paths[key], path)
+                        del temp_paths[key]
+                    directories.add(os.path.dirname(path))
+                    with self.lock:
+                        del self.in_flight[key]
+            except Exception:
+                for file in open_files:
+                    file.close()
+                for temp_path in temp_paths.values():
+                    try:
+                        os.remove(temp_path)
+                    except OSError:
+                        pass
+                # Requeue what was not applied so nothing is lost; newer writes win
+                with self.lock:
+                    for key, data in self.in_flight.items():
+                        self.pending.setdefault(key, data)
+                    self.in_flight = {}
+                raise
+
+            for directory in directories:
+                self._fsync_directory(directory)
+
+    def _fsync_directory(self, directory):
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return  # e.g. Windows cannot open directories
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def _run(self):
+        while True:
+            with self.lock:
+                deadline = time.monotonic() + self.flush_interval
+                while not self.closed and len(self.pending) < self.max_pending:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.wakeup.wait(remaining)
+                if self.closed:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing report store: {str(e)}")
+
+    def close(self):
+        """Stop the flush thread and flush; later writes raise ValueError."""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.wakeup.notify()
+        self.worker.join()
+        atexit.unregister(self.close)
+        self.flush()
+
+
+def create_report_store(backend=None, root=None):
+    """
+    Build the report store selected by configuration
+    Args:
+        backend: "local" or "memory"; defaults to $REPORT_STORE_BACKEND, then "local"
+        root: Reports directory for "local"; defaults to $REPORTS_DIR, then DEFAULT_REPORTS_DIR
+    Returns:
+        ReportStore: The configured store
+    """
+    backend = backend or os.getenv("REPORT_STORE_BACKEND", "local")
+    if backend == "memory":
+        return MemoryReportStore()
+    if backend == "local":
+        return LocalReportStore(root or os.getenv("REPORTS_DIR", DEFAULT_REPORTS_DIR))
+    raise ValueError(f"Unknown report store backend: {backend}")
@@ -9,9 +9,15 @@ from main import (
     log_report_metadata,
     create_weekly_plot,
     consolidate_reports_and_create_weekly,
-    get_next_weekly_folder
+    report_store
 )
 
+@pytest.fixture(autouse=True)
+def empty_report_store():
+    """Start every test with an empty in-memory report store"""
+    report_store.clear()
+    yield report_store
+
 # Add timeout decorator
 def timeout(seconds):
     def decorator(func):
@@ -24,20 +30,14 @@ def timeout(seconds):
     return decorator
 
 # Test file naming function - Simple and fast
-def test_get_next_report_filename(tmp_path):
+def test_get_next_report_filename():
     """Test get_next_report_filename function"""
-    test_dir = tmp_path / "reports"
-    test_dir.mkdir()
-    
-    filename1 = get_next_report_filename(str(test_dir))
-    assert filename1.endswith("report1.md")
+    filename1 = get_next_report_filename("daily-report")
+    assert filename1 == "daily-report/report1.md"
 
 # Test metadata logging - Simple and fast
-def test_log_report_metadata(tmp_path):
+def test_log_report_metadata():
     """Test log_report_metadata function"""
-    test_dir = tmp_path / "reports"
-    test_dir.mkdir()
-    
     test_metadata = {
         "filename": "report1.md",
         "generated_at": datetime.now().isoformat(),
@@ -45,8 +45,9 @@ def test_log_report_metadata(tmp_path):
         "app": 3
     }
     
-    log_report_metadata(str(test_dir), test_metadata)
-    assert (test_dir / "metadata.json").exists()
+    log_report_metadata("daily-report", test_metadata)
+    assert report_store.exists("daily-report/metadata.json")
+    assert get_next_report_filename("daily-report") == "daily-report/report2.md"
 
 # Test plot creation with timeout
 @timeout(5)
@@ -58,17 +59,8 @@ async def test_create_weekly_plot(tmp_path):
     with patch('matplotlib.pyplot.savefig') as mock_savefig:
         plot_filename = create_weekly_plot(ai_hours, app_hours, 1)
         assert mock_savefig.called
-        assert plot_filename == 'week_1_development_hours.png'
-
-# Test weekly folder creation - Simple and fast
-def test_get_next_weekly_folder(tmp_path):
-    """Test get_next_weekly_folder function"""
-    test_weekly_dir = tmp_path / "weekly-report"
-    test_weekly_dir.mkdir()
-    
-    with patch('main.WEEKLY_DIR', str(test_weekly_dir)):
-        folder1 = get_next_weekly_folder()
-        assert "daily-report-week1" in folder1
+        assert plot_filename == 'weekly-report/daily-report-week1/week_1_development_hours.png'
+        assert report_store.exists(plot_filename)
 
 # Test message handler with timeout
 @timeout(5)
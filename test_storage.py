@@ -0,0 +1,229 @@
+import os
+import time
+import threading
+import pytest
+from unittest.mock import patch
+from storage import LocalReportStore, MemoryReportStore, ReportStore, create_report_store
+
+def wait_for(condition, timeout=5):
+    """Poll condition until it is true or the timeout expires"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+# Test that incomplete backends fail on creation
+def test_report_store_is_abstract():
+    """Test ReportStore subclasses must implement every method"""
+    class Incomplete(ReportStore):
+        def write(self, key, data):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+# Test in-memory backend round trip
+def test_memory_report_store():
+    """Test MemoryReportStore write, read, move and open"""
+    store = MemoryReportStore()
+    store.write("daily-report/report1.md", "گزارش")
+
+    assert store.read_text("daily-report/report1.md") == "گزارش"
+
+    store.move("daily-report/report1.md", "weekly-report/daily-report-week1/report1.md")
+    assert not store.exists("daily-report/report1.md")
+    with store.open("weekly-report/daily-report-week1/report1.md") as file:
+        assert file.name == "report1.md"
+        assert file.read().decode("utf-8") == "گزارش"
+
+    with pytest.raises(FileNotFoundError):
+        store.read("daily-report/report1.md")
+
+# Test write-behind: reads see queued writes, disk only after flush
+def test_local_report_store_write_behind(tmp_path):
+    """Test LocalReportStore defers writes until flush"""
+    store = LocalReportStore(str(tmp_path), flush_interval=60, max_pending=100)
+    try:
+        store.write("daily-report/report1.md", "day one")
+        assert store.read_text("daily-report/report1.md") == "day one"
+        assert not (tmp_path / "daily-report" / "report1.md").exists()
+
+        store.flush()
+        assert (tmp_path / "daily-report" / "report1.md").read_text(encoding="utf-8") == "day one"
+
+        store.move("daily-report/report1.md", "weekly-report/report1.md")
+        assert not store.exists("daily-report/report1.md")
+        store.flush()
+        assert not (tmp_path / "daily-report" / "report1.md").exists()
+        assert (tmp_path / "weekly-report" / "report1.md").exists()
+    finally:
+        store.close()
+
+# Test that close flushes pending writes and releases the store
+def test_local_report_store_close_flushes(tmp_path):
+    """Test LocalReportStore.close writes everything to disk"""
+    store = LocalReportStore(str(tmp_path), flush_interval=60)
+    store.write("weekly-report/weekly_report1.md", "week one")
+    with patch("storage.atexit.unregister") as mock_unregister:
+        store.close()
+        mock_unregister.assert_called_once_with(store.close)
+
+    assert os.path.exists(tmp_path / "weekly-report" / "weekly_report1.md")
+    assert not store.worker.is_alive()
+
+    # Nothing would flush writes made after close, so they are rejected
+    with pytest.raises(ValueError):
+        store.write("weekly-report/weekly_report2.md", "week two")
+    store.close()
+
+# Test reads while a flush is writing the batch
+def test_local_report_store_read_during_flush(tmp_path):
+    """Test keys stay readable between dequeue and os.replace"""
+    store = LocalReportStore(str(tmp_path), flush_interval=60, max_pending=100)
+    started = threading.Event()
+    release = threading.Event()
+    real_fsync = os.fsync
+
+    def slow_fsync(fd):
+        started.set()
+        release.wait(5)
+        real_fsync(fd)
+
+    try:
+        store.write("daily-report/report1.md", "day one")
+        with patch("storage.os.fsync", side_effect=slow_fsync):
+            flusher = threading.Thread(target=store.flush)
+            flusher.start()
+            assert started.wait(5)
+
+            assert store.exists("daily-report/report1.md")
+            assert store.read_text("daily-report/report1.md") == "day one"
+
+            release.set()
+            flusher.join(5)
+        assert store.in_flight == {}
+        assert (tmp_path / "daily-report" / "report1.md").exists()
+    finally:
+        release.set()
+        store.close()
+
+# Test the background thread flushes once max_pending writes are queued
+def test_local_report_store_flushes_on_max_pending(tmp_path):
+    """Test the max_pending wakeup of the flush thread"""
+    store = LocalReportStore(str(tmp_path), flush_interval=60, max_pending=2)
+    try:
+        store.write("daily-report/report1.md", "one")
+        assert not wait_for(lambda: (tmp_path / "daily-report" / "report1.md").exists(), timeout=0.2)
+
+        store.write("daily-report/report2.md", "two")
+        assert wait_for(lambda: (tmp_path / "daily-report" / "report2.md").exists())
+        assert (tmp_path / "daily-report" / "report1.md").exists()
+    finally:
+        store.close()
+
+# Test the background thread flushes after flush_interval
+def test_local_report_store_flushes_on_interval(tmp_path):
+    """Test the flush_interval deadline of the flush thread"""
+    store = LocalReportStore(str(tmp_path), flush_interval=0.05, max_pending=100)
+    try:
+        store.write("weekly-report/weekly_report1.md", "week one")
+        assert wait_for(lambda: (tmp_path / "weekly-report" / "weekly_report1.md").exists())
+    finally:
+        store.close()
+
+# Test a failed flush requeues the batch
+def test_local_report_store_requeues_on_error(tmp_path):
+    """Test writes survive a failing flush and land on the next one"""
+    store = LocalReportStore(str(tmp_path), flush_interval=60, max_pending=100)
+    try:
+        store.write("daily-report/report1.md", "day one")
+        with patch("storage.os.replace", side_effect=OSError("disk full")):
+            with pytest.raises(OSError):
+                store.flush()
+
+        assert store.read_text("daily-report/report1.md") == "day one"
+        assert not (tmp_path / "daily-report" / "report1.md").exists()
+        assert list(tmp_path.rglob("*.tmp")) == []
+
+        store.flush()
+        assert (tmp_path / "daily-report" / "report1.md").read_text(encoding="utf-8") == "day one"
+    finally:
+        store.close()
+
+# Test that a rename in progress doesn't block other callers
+def test_local_report_store_rename_outside_lock(tmp_path):
+    """Test write, read and exists proceed while a flush is inside os.replace"""
+    store = LocalReportStore(str(tmp_path), flush_interval=60, max_pending=100)
+    started = threading.Event()
+    release = threading.Event()
+    real_replace = os.replace
+
+    def slow_replace(source, destination):
+        started.set()
+        release.wait(5)
+        real_replace(source, destination)
+
+    try:
+        store.write("daily-report/report1.md", "day one")
+        with patch("storage.os.replace", side_effect=slow_replace):
+            flusher = threading.Thread(target=store.flush)
+            flusher.start()
+            assert started.wait(5)
+
+            # These would deadlock if the rename held the lock
+            store.write("daily-report/report2.md", "day two")
+            assert store.read_text("daily-report/report1.md") == "day one"
+            assert not store.exists("daily-report/report3.md")
+
+            release.set()
+            flusher.join(5)
+        assert not flusher.is_alive()
+        assert store.read_text("daily-report/report2.md") == "day two"
+    finally:
+        release.set()
+        store.close()
+
+# Test backend selection from configuration
+def test_create_report_store(tmp_path, monkeypatch):
+    """Test create_report_store honours REPORT_STORE_BACKEND and REPORTS_DIR"""
+    monkeypatch.setenv("REPORT_STORE_BACKEND", "memory")
+    assert isinstance(create_report_store(), MemoryReportStore)
+
+    monkeypatch.setenv("REPORT_STORE_BACKEND", "local")
+    monkeypatch.setenv("REPORTS_DIR", str(tmp_path / "reports"))
+    store = create_report_store()
+    try:
+        assert isinstance(store, LocalReportStore)
+        assert store.root == str(tmp_path / "reports")
+    finally:
+        store.close()
+
+    with pytest.raises(ValueError):
+        create_report_store(backend="s3")
+
+# Test that flushes apply changes in the order they were last made
+def test_local_report_store_flush_order(tmp_path):
+    """Test a re-queued key is applied after keys written before it"""
+    store = LocalReportStore(str(tmp_path), flush_interval=60, max_pending=100)
+    applied = []
+    real_replace = os.replace
+
+    def record_replace(source, destination):
+        applied.append(os.path.relpath(destination, tmp_path))
+        real_replace(source, destination)
+
+    try:
+        store.write("daily-report/metadata.json", "[]")
+        store.write("daily-report/report1.md", "day one")
+        store.write("daily-report/metadata.json", '[[{"filename": "report1.md"}]]')
+        with patch("storage.os.replace", side_effect=record_replace):
+            store.flush()
+
+        assert applied == [
+            os.path.join("daily-report", "report1.md"),
+            os.path.join("daily-report", "metadata.json"),
+        ]
+    finally:
+        store.close()
@@ -0,0 +1,115 @@
+import pytest
+import threading
+from unittest.mock import MagicMock, Mock
+from utils import (
+    GPT_TASKS,
+    TruncatedResponseError,
+    format_task_usage,
+    get_gpt_response,
+    get_task_usage,
+    record_task_usage,
+    task_usage
+)
+
+def make_client(content="ok", prompt_tokens=10, cached_tokens=0, completion_tokens=5, finish_reason="stop"):
+    """Build a fake OpenAI client returning a fixed completion"""
+    completion = MagicMock()
+    completion.choices[0].message.content = content
+    completion.choices[0].finish_reason = finish_reason
+    completion.usage.prompt_tokens = prompt_tokens
+    completion.usage.completion_tokens = completion_tokens
+    completion.usage.prompt_tokens_details.cached_tokens = cached_tokens
+    client = Mock()
+    client.chat.completions.create.return_value = completion
+    return client
+
+# Test that user text is sent last, after the static system prefix
+def test_get_gpt_response_uses_task_config():
+    """Test get_gpt_response builds the request from GPT_TASKS"""
+    client = make_client(content='{"ai": 3, "app": 4}')
+
+    response = get_gpt_response("I worked 3h on AI", client, task="worked_hours")
+
+    assert response == '{"ai": 3, "app": 4}'
+    kwargs = client.chat.completions.create.call_args.kwargs
+    config = GPT_TASKS["worked_hours"]
+    assert kwargs["model"] == config["model"]
+    assert kwargs["max_tokens"] == config["max_tokens"]
+    assert kwargs["response_format"]["type"] == "json_schema"
+    assert kwargs["response_format"]["json_schema"]["strict"] is True
+    assert kwargs["response_format"]["json_schema"]["schema"]["required"] == ["ai", "app"]
+    assert kwargs["messages"][0] == {"role": "system", "content": config["system"]}
+    assert kwargs["messages"][-1] == {"role": "user", "content": "I worked 3h on AI"}
+
+# Test per-task usage accounting
+def test_get_gpt_response_records_usage():
+    """Test token usage and latency are accumulated per task"""
+    task_usage.clear()
+    client = make_client(prompt_tokens=100, cached_tokens=64, completion_tokens=20)
+
+    get_gpt_response("day one", client, task="daily-report")
+    get_gpt_response("day two", client, task="daily-report")
+
+    stats = get_task_usage()["daily-report"]
+    assert stats["calls"] == 2
+    assert stats["prompt_tokens"] == 200
+    assert stats["cached_tokens"] == 128
+    assert stats["completion_tokens"] == 40
+    assert stats["truncated"] == 0
+    assert stats["avg_latency"] >= 0
+
+# Test that responses cut off by max_tokens are counted
+def test_get_gpt_response_counts_truncation():
+    """Test finish_reason 'length' is recorded as truncated"""
+    task_usage.clear()
+
+    response = get_gpt_response("long text", make_client(content="partial", finish_reason="length"), task="summary")
+
+    assert response == "partial"
+    assert get_task_usage()["summary"]["truncated"] == 1
+
+# Test that truncated reports are rejected instead of returned
+def test_get_gpt_response_rejects_truncated_report():
+    """Test report tasks raise TruncatedResponseError on finish_reason 'length'"""
+    task_usage.clear()
+
+    with pytest.raises(TruncatedResponseError):
+        get_gpt_response("long week", make_client(content="partial", finish_reason="length"), task="weekly-report")
+
+    assert get_task_usage()["weekly-report"]["truncated"] == 1
+
+# Test the usage summary
+def test_format_task_usage():
+    """Test format_task_usage renders one line per task"""
+    task_usage.clear()
+    assert format_task_usage() == "No GPT calls recorded yet."
+
+    get_gpt_response("day one", make_client(prompt_tokens=100, cached_tokens=64), task="daily-report")
+
+    assert format_task_usage().startswith("daily-report: calls=1 prompt=100 cached=64")
+
+# Test concurrent handlers don't lose counts
+def test_record_task_usage_thread_safe():
+    """Test record_task_usage from many threads"""
+    task_usage.clear()
+    usage = Mock(prompt_tokens=1, completion_tokens=1)
+    usage.prompt_tokens_details.cached_tokens = 0
+
+    def worker():
+        for _ in range(1000):
+            record_task_usage("summary", usage, 0.0)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = get_task_usage()["summary"]
+    assert stats["calls"] == 8000
+    assert stats["prompt_tokens"] == 8000
+
+def test_get_gpt_response_unknown_task():
+    """Test unknown tasks are rejected"""
+    with pytest.raises(ValueError):
+        get_gpt_response("text", make_client(), task="nope")
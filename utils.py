@@ -1,6 +1,7 @@
 import requests
 import os
 import time
+import threading
 import telebot
 
 def split_text_into_chunks(text, chunk_size):
@@ -74,84 +75,157 @@ def whisper(file_url, client):
   
   return transcription.text
 
-def get_gpt_response(text: str, client, task: str):
-    if task == "default":
-        response = client.chat.completions.create(
-            model='gpt-4o-mini',
-            messages=[
-                {
-                    "role": "system",
-                    "content": "وظیفه تو تصحیح غلط های املایی در یک متن هست. تو نباید هیج تغییری در حالت صحبت یا محتوای متن انجام بدی و فقط باید در سطح کلمات غلط های املایی رو درست کنی."
+# تعریف تسک‌ها: پیشوند سیستم ثابت است و متن کاربر همیشه آخر می‌آید تا prompt caching کار کند
+# temperature: تصحیح املا و استخراج ساعت‌ها باید قطعی باشند (0.0)، خلاصه کمی آزادی دارد (0.3)
+# و گزارش‌ها کمی پایین‌تر از پیش‌فرض API یعنی 1.0 هستند (0.7) تا فرمت گزارش‌ها یکدست بماند
+# اگر پاسخی به سقف max_tokens برسد، در task_usage با truncated شمرده و لاگ می‌شود
+# سقف گزارش‌ها جا برای گزارش کامل می‌گذارد؛ گزارشی که باز هم بریده شود با
+# TruncatedResponseError رد می‌شود (reject_truncated) تا ناقص ذخیره یا ارسال نشود
+GPT_TASKS = {
+    "default": {
+        "model": "gpt-4o-mini",
+        "max_tokens": 2048,
+        "temperature": 0.0,
+        "response_format": None,
+        "system": (
+            "وظیفه تو تصحیح غلط های املایی در یک متن هست. تو نباید هیج تغییری در حالت صحبت یا محتوای متن انجام بدی و فقط باید در سطح کلمات غلط های املایی رو درست کنی. "
+            "کلمات متن کاربر رو بدون هیچ تغییری در حالت صحبت متن تصحیح املایی کن و کلمات رو از حالت فعلی در نیار. یعنی کلمات مجلسی رو عامیانه نکن و برعکس. و متن رو دوباره بفرست"
+        ),
+    },
+    "summary": {
+        "model": "gpt-4o-mini",
+        "max_tokens": 1024,
+        "temperature": 0.3,
+        "response_format": None,
+        "system": (
+            "وظیفه تو خلاصه سازی یک متن هست بدون اینکه از معناش چیزی کم بشه یا نکته ای جا بیفته. "
+            "متن کاربر رو به این حالت خلاصه کن : باید همه نکات مهم استخراج بشن. نباید هیچ نکته مهمی جا بمونه. حالت صحبت متن رو عوض نکن. با فرمت قابل فهمی بنویس"
+        ),
+    },
+    "weekly-report": {
+        "model": "gpt-4o-mini",
+        "max_tokens": 16384,  # gpt-4o-mini output ceiling; input is up to 7 daily reports
+        "temperature": 0.7,
+        "response_format": None,
+        "reject_truncated": True,
+        "system": "You are a report assistant, user will give you a breif explannation of what he did during the week and you are supposed to wrap everything up in a weekly-report format. use markdown",
+    },
+    "daily-report": {
+        "model": "gpt-4o-mini",
+        "max_tokens": 4096,
+        "temperature": 0.7,
+        "response_format": None,
+        "reject_truncated": True,
+        "system": "use the information that is provided by the user to create a daily report.ensure that user provided the date of the report. use markdown",
+    },
+    "worked_hours": {
+        "model": "gpt-4o-mini",
+        "max_tokens": 50,
+        "temperature": 0.0,
+        "response_format": {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "worked_hours",
+                "strict": True,
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "ai": {"type": "integer"},
+                        "app": {"type": "integer"},
+                    },
+                    "required": ["ai", "app"],
+                    "additionalProperties": False,
                 },
-                {
-                    "role": "user",
-                    "content": f"""کلمات این متن رو بدون هیچ تغییری در حالت صحبت متن تصحیح املایی کن و کلمات رو از حالت فعلی در نیار. یعنی کلمات مجلسی رو عامیانه نکن و برعکس. و متن رو دوباره بفرست {text}"""
-                }
-            ],
-            stream=False
-        ).choices[0].message.content
-    elif task == "summary":
-        response = client.chat.completions.create(
-            model='gpt-4o-mini',
-            messages=[
-                {
-                    "role": "system",
-                    "content": "وظیفه تو خلاصه سازی یک متن هست بدون اینکه از معناش چیزی کم بشه یا نکته ای جا بیفته."
-                },
-                {
-                    "role": "user",
-                    "content": f"""این متن رو به این حالت خلاصه کن : باید همه نکات مهم استخراج بشن. نباید هیچ نکته مهمی جا بمونه. حالت صحبت متن رو عوض نکن. با فرمت قابل فهمی بنویس: {text}"""
-                }
-            ],
-            stream=False
-        ).choices[0].message.content
-    
-    elif task == 'weekly-report':
-        response = client.chat.completions.create(
-            model = 'gpt-4o-mini',
-            messages = [
-                {
-                    "role": "system",
-                    "content": "You are a report assistant, user will give you a breif explannation of what he did during the week and you are supposed to wrap everything up in a weekly-report format. use markdown"
-                },
-                {
-                    "role":"user",
-                    "content": f"{text}"
-                }
-            ],
-            stream=False
-        ).choices[0].message.content
+            },
+        },
+        "system": "extract this information from the provided text : how many hours they spent on AI-Dev, How many hours they spent on Application-Dev.",
+    },
+}
 
-    elif task == 'daily-report':
-        response = client.chat.completions.create(
-            model = 'gpt-4o-mini',
-            messages = [
-                {
-                    "role": "system",
-                    "content": "use the information that is provided by the user to create a daily report.ensure that user provided the date of the report. use markdown"
-                },
-                {
-                    "role":"user",
-                    "content": f"{text}"
-                }
-            ],
-            stream=False
-        ).choices[0].message.content
-        
-    elif task == 'worked_hours':
-        response = client.chat.completions.create(
-            model = 'gpt-4o-mini',
-            messages = [
-                {
-                    "role": "system",
-                    "content": "extract this information from the provided text : how many hours they spent on AI-Dev, How many hours they spent on Application-Dev. output the follwing json : {'ai': int, 'app': int}. dont output it like : ``` json ```"
-                },
-                {
-                    "role":"user",
-                    "content": f"{text}"
-                }
-            ],
-            stream=False
-        ).choices[0].message.content
-        
-    return response
+class TruncatedResponseError(Exception):
+    """Raised when a task that must not be cut off hits its max_tokens cap."""
+
+    def __init__(self, task: str, max_tokens: int):
+        super().__init__(f"task '{task}' hit max_tokens={max_tokens}, response is truncated")
+        self.task = task
+        self.max_tokens = max_tokens
+
+# آمار مصرف توکن و زمان پاسخ برای هر تسک
+task_usage = {}
+task_usage_lock = threading.Lock()  # handlers run on TeleBot's thread pool
+
+def record_task_usage(task: str, usage, latency: float, truncated: bool = False):
+    """Accumulate token usage and latency of one completion under its task name."""
+    prompt_tokens = completion_tokens = cached_tokens = 0
+    if usage is not None:
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", 0) or 0
+
+    with task_usage_lock:
+        stats = task_usage.setdefault(task, {
+            "calls": 0,
+            "truncated": 0,
+            "prompt_tokens": 0,
+            "cached_tokens": 0,
+            "completion_tokens": 0,
+            "total_latency": 0.0,
+        })
+        stats["calls"] += 1
+        stats["truncated"] += int(truncated)
+        stats["total_latency"] += latency
+        stats["prompt_tokens"] += prompt_tokens
+        stats["completion_tokens"] += completion_tokens
+        stats["cached_tokens"] += cached_tokens
+
+def get_task_usage():
+    """Return a snapshot of per-task usage, including the average latency in seconds."""
+    with task_usage_lock:
+        return {
+            task: dict(stats, avg_latency=stats["total_latency"] / stats["calls"])
+            for task, stats in task_usage.items()
+        }
+
+def format_task_usage():
+    """Render get_task_usage() as one line per task, for logs and the /usage command."""
+    lines = []
+    for task, stats in sorted(get_task_usage().items()):
+        lines.append(
+            f"{task}: calls={stats['calls']} prompt={stats['prompt_tokens']} "
+            f"cached={stats['cached_tokens']} completion={stats['completion_tokens']} "
+            f"truncated={stats['truncated']} avg_latency={stats['avg_latency']:.2f}s"
+        )
+    return "\n".join(lines) if lines else "No GPT calls recorded yet."
+
+def get_gpt_response(text: str, client, task: str):
+    if task not in GPT_TASKS:
+        raise ValueError(f"Unknown task: {task}")
+    config = GPT_TASKS[task]
+
+    request = {
+        "model": config["model"],
+        "messages": [
+            {"role": "system", "content": config["system"]},
+            {"role": "user", "content": text},
+        ],
+        "max_tokens": config["max_tokens"],
+        "temperature": config["temperature"],
+        "stream": False,
+    }
+    if config["response_format"] is not None:
+        request["response_format"] = config["response_format"]
+
+    start = time.perf_counter()
+    completion = client.chat.completions.create(**request)
+    latency = time.perf_counter() - start
+
+    choice = completion.choices[0]
+    truncated = getattr(choice, "finish_reason", None) == "length"
+    record_task_usage(task, getattr(completion, "usage", None), latency, truncated)
+    if truncated:
+        if config.get("reject_truncated"):
+            raise TruncatedResponseError(task, config["max_tokens"])
+        print(f"Warning in get_gpt_response: task '{task}' hit max_tokens={config['max_tokens']}, response is truncated")
+
+    return choice.message.content